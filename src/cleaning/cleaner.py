@@ -1,5 +1,8 @@
 # src/cleaning/cleaner.py
 
+import functools
+import os
+
 import pandas as pd
 import numpy as np
 
@@ -17,75 +20,78 @@ TYPE_TRANSLATION = {
 }
 # ---------------------
 
+_SPACE_TO_UNDERSCORE = str.maketrans({' ': '_'})
+
 def normalize_name(s):
     """Converts CDM string (e.g., 'Record ID') to flat snake_case (e.g., 'record_id')."""
-    if pd.isna(s) or s.lower() in ['nan', '']:
+    # Cells from a dtype=str read can only be missing as None or float NaN
+    # (NaN != NaN), so the general pd.isna check is not needed here
+    if s is None or s != s:
         return None
-    return str(s).strip().lower().replace(' ', '_')
+    normalized = str(s).strip().lower().translate(_SPACE_TO_UNDERSCORE)
+    return normalized if normalized not in ('', 'nan') else None
+
+def _read_cdm_csv(cdm_file_path):
+    """
+    Reads the CDM schema csv with the faster pyarrow parser when available,
+    only loading the columns the map builder actually uses.
+    """
+    read_kwargs = dict(dtype=str, usecols=['Level 1', 'Level 2', 'Level 3', 'Format'])
+    try:
+        return pd.read_csv(cdm_file_path, engine='pyarrow', **read_kwargs)
+    except (ImportError, ValueError):
+        # pyarrow not installed (or it rejected an option): use the default engine
+        return pd.read_csv(cdm_file_path, **read_kwargs)
 
 def create_cdm_column_map(cdm_file_path):
     """
-    Reads the CDM csv file, forward-fills, and generates a single map:
+    Reads the CDM csv file, forward-fills, and generates a single map.
+    The map only depends on the CDM file, so it is cached on (path, mtime)
+    to avoid re-reading the csv for every report processed.
+    NOTE: callers should treat the returned dict as read-only (it is shared).
     """
+    return _create_cdm_column_map_cached(cdm_file_path, os.path.getmtime(cdm_file_path))
+
+@functools.lru_cache(maxsize=4)
+def _create_cdm_column_map_cached(cdm_file_path, cdm_file_mtime):
+    """Builds the flat column name -> format map from the CDM csv file."""
     try:
-        cdm_raw = pd.read_csv(cdm_file_path, dtype=str)
+        cdm_raw = _read_cdm_csv(cdm_file_path)
         print("[CLEANER]CDM Schema loaded successfully.")
     except Exception as e:
         print(f"[CLEANER]Could not load CDM schema. {e}")
 
-    flat_to_format_map = {} 
-
     # 1. Forward-Fill NaN values
-    cdm = cdm_raw.copy()
-    cdm['Level 1'] = cdm['Level 1'].ffill()
-    cdm['Level 2'] = cdm['Level 2'].ffill()
-    cdm['Level 3'] = cdm['Level 3'].fillna(np.nan)
-    
-    # 2. Iterate and Build Map
-    for index, row in cdm.iterrows():
-        # Get levels and required format
-        l1 = str(row['Level 1']).strip()
-        l2 = str(row['Level 2']).strip()
-        l3 = str(row['Level 3']).strip()
-        required_format = str(row.get('Format', '')).strip()
-        
-        # 3. Normalize Names
-        normalized_l1 = normalize_name(l1)
-        normalized_l2 = normalize_name(l2)
-        normalized_l3 = normalize_name(l3)
-
-        # 4. Determine Flat Column Name
-        # Start with an empty list for parts
-        flat_parts = []
-        
-        # Append all non-None, normalized parts in order
-        if normalized_l1:
-            flat_parts.append(normalized_l1)
-        if normalized_l2:
-            flat_parts.append(normalized_l2)
-        if normalized_l3:
-            flat_parts.append(normalized_l3)
-        
-        if not flat_parts:
-            continue
-        
-        flat_col_name = "_".join(flat_parts)
-        
-        format_type = TYPE_TRANSLATION.get(required_format)
-    
-        # 5. Execute Mapping
-        if required_format in TYPE_TRANSLATION:
-            format_type = TYPE_TRANSLATION[required_format]
-        
-        # Add 'data_' prefix to separate core data columns from metadata columns
-        if normalized_l1 in ['record', 'victim', 'incident']:
-                flat_col_name = "data_" + flat_col_name
-        
-        flat_to_format_map[flat_col_name] = format_type
-                  
-    # 6. Return the format map
-    #print("Combined format map built successfully.")
-    return flat_to_format_map
+    # ffill per Series; copying the whole frame just to fill two columns
+    # allocated a duplicate of every column
+    # 2. Normalize the level names column-wise (vectorized version of normalize_name)
+    l1n = _normalize_level(cdm_raw['Level 1'].ffill())
+    l2n = _normalize_level(cdm_raw['Level 2'].ffill())
+    l3n = _normalize_level(cdm_raw['Level 3'])
+
+    # 3. Determine Flat Column Name by joining the non-empty levels with '_'
+    flat_col_names = (l1n.fillna('') + '_' + l2n.fillna('') + '_' + l3n.fillna('')) \
+        .str.replace(r'_{2,}', '_', regex=True) \
+        .str.strip('_')
+
+    # 4. Translate the required format into the internal type names
+    format_types = cdm_raw['Format'].str.strip().map(TYPE_TRANSLATION)
+    format_types = format_types.astype(object).where(format_types.notna(), None)
+
+    # 5. Add 'data_' prefix to separate core data columns from metadata columns
+    flat_col_names = flat_col_names.where(
+        ~l1n.isin(['record', 'victim', 'incident']),
+        'data_' + flat_col_names
+    )
+
+    # 6. Return the format map, skipping rows that produced no column name
+    has_name = flat_col_names != ''
+    return dict(zip(flat_col_names[has_name], format_types[has_name]))
+
+def _normalize_level(level: pd.Series) -> pd.Series:
+    """Vectorized normalize_name: flat snake_case with empty/'nan' cells as NaN."""
+    normalized = level.str.strip().str.lower().str.replace(' ', '_', regex=False)
+    return normalized.mask(normalized.isin(['', 'nan']))
 
 def clean_and_preprocess(df, flat_to_format_map):
     """
@@ -105,51 +111,61 @@ def clean_and_preprocess(df, flat_to_format_map):
     # NOTE: The column names here must be accurate to the column names set in app.py.
     
     # Convert empty strings and whitespace to NaN
-    df.replace(r'^\s*$', np.nan, regex=True, inplace=True)
+    # Masking per string column is much cheaper than a full-frame regex replace
+    for col in df.select_dtypes(include=['object', 'string']).columns:
+        s = df[col]
+        df[col] = s.mask(s.str.strip().eq(''))
+    # Column membership tests below go through a set: 'col in df.columns'
+    # scans the Index linearly on wide schemas
+    col_set = set(df.columns)
+
     # Drop rows where critical ID columns are missing
     required_ids = ['data_record_record_id', 'data_victim_victim_id','data_trafficker_trafficker_id']
     # Check if these columns exist before dropping
-    existing_ids = [col for col in required_ids if col in df.columns]
+    existing_ids = [col for col in required_ids if col in col_set]
     
     if existing_ids:
         df.dropna(subset=existing_ids, inplace=True)
     else:
         print("[CLEANER] Warning: Critical ID columns missing in input.")
     
-    STRING_COLUMNS = []
-    INT_COLUMNS = []
-    FLOAT_COLUMNS = []
-    DATE_COLUMNS = []
-
     # 3. Convert the data to correct data type defined by the format map for further data processing steps
-    for flat_col_name in df.columns:
-        
-        # Use .get() to look up the required format directly from the map
-        required_format = flat_to_format_map.get(flat_col_name)
-        
-        if required_format == 'STRING':
-            STRING_COLUMNS.append(flat_col_name)
-        elif required_format == 'INT':
-            INT_COLUMNS.append(flat_col_name)
-        elif required_format == 'FLOAT':
-            FLOAT_COLUMNS.append(flat_col_name)
-        elif required_format == 'DATE':
-            DATE_COLUMNS.append(flat_col_name)
+    # Classify the present columns by required format in a single pass
+    columns_by_format = {'STRING': [], 'INT': [], 'FLOAT': [], 'DATE': []}
+    for flat_col_name, required_format in flat_to_format_map.items():
+        if flat_col_name in col_set and required_format in columns_by_format:
+            columns_by_format[required_format].append(flat_col_name)
+
+    STRING_COLUMNS = columns_by_format['STRING']
+    INT_COLUMNS = columns_by_format['INT']
+    FLOAT_COLUMNS = columns_by_format['FLOAT']
+    DATE_COLUMNS = columns_by_format['DATE']
             
     # Applying data type conversions
-    
+
+    # a0. STRING Conversion
+    # Convert low-cardinality string columns (nationality, gender, ...) to
+    # category, so repeated values are stored once per unique value instead
+    # of once per row
+    if len(df) > 0:
+        for col in STRING_COLUMNS:
+            if df[col].nunique(dropna=True) / len(df) < 0.5:
+                df[col] = df[col].astype('category')
+
     # a. INTEGER Conversion
-    for col in INT_COLUMNS:
-        df[col] = pd.to_numeric(df[col], errors='coerce').astype('Int64')
-    
+    if INT_COLUMNS:
+        df[INT_COLUMNS] = df[INT_COLUMNS].apply(pd.to_numeric, errors='coerce').astype('Int64')
+
     # b. FLOAT Conversion
-    for col in FLOAT_COLUMNS:
-        df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
-    
+    if FLOAT_COLUMNS:
+        df[FLOAT_COLUMNS] = df[FLOAT_COLUMNS].apply(pd.to_numeric, errors='coerce').astype('float64')
+
     # c. DATE Conversion
-    for col in DATE_COLUMNS:
-        # Use infer_datetime_format=True for flexibility in parsing JSON dates.
-        df[col] = pd.to_datetime(df[col], errors='coerce', infer_datetime_format=True)
+    if DATE_COLUMNS:
+        # The JSON dates are ISO8601; saying so explicitly hits pandas' fast
+        # C parser (infer_datetime_format is deprecated and only guessed this)
+        df[DATE_COLUMNS] = df[DATE_COLUMNS].apply(pd.to_datetime, errors='coerce',
+                                                  format='ISO8601')
     
     # 4. Anonymize the location information by rounding the latitude and longitude
     # NOTE: The column names here must be accurate to the column names set in app.py.
@@ -162,11 +178,11 @@ def clean_and_preprocess(df, flat_to_format_map):
         'data_incident_destination_longitude'
     ]
 
-    for col in location_cols:
-        # Check if column exists to avoid KeyErrors if the schema changes
-        if col in df.columns:
-            # Round to 3 decimal places
-            df[col] = df[col].round(3)
+    # Check which columns exist to avoid KeyErrors if the schema changes,
+    # then round all of them to 3 decimal places in one call
+    present_location_cols = [col for col in location_cols if col in col_set]
+    if present_location_cols:
+        df[present_location_cols] = df[present_location_cols].round(3)
     
     print("[PIPELINE] Data cleaning complete.")
     return df
@@ -71,7 +71,6 @@ def run_full_pipeline(raw_df, raw_json_path=None):
                 cleaned_source_id = source_id.lstrip('#')
                 target_dir = os.path.join(PROCESSED_JSON_DIR, cleaned_source_id)
                 os.makedirs(target_dir, exist_ok=True)
-                json_filename = os.path.basename(raw_json_path)
                 final_json_path = os.path.join(target_dir, json_filename)
                 shutil.move(raw_json_path, final_json_path)
                 print(f"[INFO] Archived JSON to: {final_json_path}")
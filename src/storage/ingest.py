@@ -1,5 +1,6 @@
 # src/storage/ingest.py
 
+import atexit
 import os
 from typing import Optional
 from franz.openrdf.sail.allegrographserver import AllegroGraphServer
@@ -15,45 +16,77 @@ AG_USER = "admin"
 AG_PASSWORD = "YOUR_PASSWORD_HERE"
 AG_CATALOG = "" # root
 
+# Open connections per repository name, reused across ingest calls so a
+# pipeline loop does not pay the TLS handshake + auth for every file
+_conn_cache = {}
+
+def _get_connection(repository_name: str):
+    """Returns a cached connection to the repository, opening one if needed."""
+    conn = _conn_cache.get(repository_name)
+    if conn is not None:
+        return conn
+
+    server = AllegroGraphServer(AG_HOST, AG_PORT, AG_USER, AG_PASSWORD)
+    catalog = server.openCatalog(AG_CATALOG)
+
+    # Open an existing source repository, or create a new one if the source repository is not found
+    repository = catalog.getRepository(repository_name, Repository.ACCESS)
+    conn = repository.getConnection()
+    _conn_cache[repository_name] = conn
+    return conn
+
+def _drop_connection(repository_name: str):
+    """Closes and forgets a cached connection (e.g. after a failed upload)."""
+    conn = _conn_cache.pop(repository_name, None)
+    if conn is not None:
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+def _close_all_connections():
+    for repository_name in list(_conn_cache):
+        _drop_connection(repository_name)
+
+atexit.register(_close_all_connections)
+
 def ingest_rdf_file(file_path: str, source_id: str, context_uri: Optional[str] = None) -> bool:
     """
-    Ingests an N-Triples (.nt) file directly into AllegroGraph source id repository 
+    Ingests an N-Triples (.nt) file directly into AllegroGraph source id repository
     """
-    
+
     # 1. Validate File Existence
     if not os.path.exists(file_path):
         print(f"[INGEST] ERROR: File not found at {file_path}")
         return False
-        
-    print(f"[INGEST] Connecting to AllegroGraph at {AG_HOST}...")
-
-    try:
-        # 2. Connect to Server -> Catalog -> Repository (Source id based)
-        server = AllegroGraphServer(AG_HOST, AG_PORT, AG_USER, AG_PASSWORD)
-        catalog = server.openCatalog(AG_CATALOG)
-        
-        # Open an existing source repository, or create a new one if the source repository is not found
-        mode = Repository.ACCESS
-        cleaned_source_id = source_id.lstrip('#')
-        repository_name = f"{cleaned_source_id}_repo"
-        repository = catalog.getRepository(repository_name, mode)
-        conn = repository.getConnection()
-        
-        print(f"[INGEST] Connection established. Uploading file: {file_path}")
-        
-        # 3. Ingest nt file using addFile
-        conn.addFile(file_path, base=None, format=RDFFormat.NTRIPLES, context=context_uri)
-        total_triples = conn.size()
-        print(f"[INGEST] SUCCESS: File loaded. Repository {repository_name} now contains {total_triples} triples.")
-        
-        return True
-
-    except Exception as e:
-        print(f"[INGEST] FAILURE: Data loading failed. Error: {e}")
-        return False
-        
-    finally:
-        # 4. Ensure connection is closed
-        if conn:
-            conn.close()
-            # print("[INGEST] Connection closed.")
\ No newline at end of file
+
+    cleaned_source_id = source_id.lstrip('#')
+    repository_name = f"{cleaned_source_id}_repo"
+
+    # 2. Reuse (or open) the connection for this source repository.
+    # A cached session may have idled out server-side between submissions,
+    # so a failure on one is retried once on a fresh connection
+    attempts = 2 if repository_name in _conn_cache else 1
+
+    for attempt in range(attempts):
+        try:
+            conn = _get_connection(repository_name)
+
+            print(f"[INGEST] Connection ready. Uploading file: {file_path}")
+
+            # 3. Ingest nt file using addFile
+            conn.addFile(file_path, base=None, format=RDFFormat.NTRIPLES, context=context_uri)
+            total_triples = conn.size()
+            print(f"[INGEST] SUCCESS: File loaded. Repository {repository_name} now contains {total_triples} triples.")
+
+            return True
+
+        except Exception as e:
+            # The connection may be broken; drop it so the retry (or the
+            # next call) reconnects
+            _drop_connection(repository_name)
+            if attempt + 1 < attempts:
+                print(f"[INGEST] Upload over cached connection failed ({e}). Retrying with a fresh connection...")
+                continue
+            print(f"[INGEST] FAILURE: Data loading failed. Error: {e}")
+            return False
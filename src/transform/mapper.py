@@ -1,11 +1,14 @@
 # src/transform/mapper.py
 
+import functools
 import pandas as pd
+import numpy as np
 import re
-import os 
-import yaml 
+import os
+import yaml
+from concurrent.futures import ProcessPoolExecutor
 from typing import List, Tuple
-from io import StringIO
+from io import BytesIO
 
 # --- Configuration ---
 # Define the expected location of the YML mapping file
@@ -26,13 +29,6 @@ def safe_str(x):
 
 PLACEHOLDER_RE = re.compile(r"\$\(([^)]+)\)")
 
-def substitute_placeholders(template: str, row: pd.Series) -> str:
-    """Replace $(Column_Name) in template with the corresponding row values."""
-    def repl(match):
-        col = match.group(1)
-        return safe_str(row.get(col, "")) 
-    return PLACEHOLDER_RE.sub(repl, template)
-
 def expand_prefixed(iri_or_curie: str, prefixes: dict) -> str:
     """Expand CURIE like schema:Person using prefixes dict to full IRI."""
     iri_or_curie = iri_or_curie.strip()
@@ -44,115 +40,288 @@ def expand_prefixed(iri_or_curie: str, prefixes: dict) -> str:
             return prefixes[prefix] + local
     return iri_or_curie
 
+# Translation table covering backslashes, quotes, newlines, etc.
+_NT_ESCAPES = {
+    ord("\\"): "\\\\",
+    ord('"'): '\\"',
+    ord("\n"): "\\n",
+    ord("\r"): "\\r",
+}
+
 def escape_literal(value: str) -> str:
     """Escape value for N-Triples literal."""
-    # Escape backslashes first, then quotes, newlines, etc.
-    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\r", "\\r")
+    # One str.translate pass instead of four chained str.replace calls
+    return value.translate(_NT_ESCAPES)
 
 def is_prefixed_resource(value: str, prefixes: dict) -> bool:
     """Decide if value should be treated as IRI or literal."""
     value = value.strip()
-    for prefix in prefixes.keys():
-        if value.startswith(prefix + ":"):
-            return True
-    return False
+    # A single dict lookup on the leading token instead of scanning all prefixes
+    return ":" in value and value.split(":", 1)[0] in prefixes
 
 # --- Function to Load Mapping ---
 
 def load_mapping_config(yml_path=YML_MAPPING_PATH):
-    """Loads YARRRML prefixes and mappings from the file system."""
-    
-    # print(f"[INFO] Loading YARRRML mapping from: {yml_path}")
-    
+    """Loads YARRRML prefixes and mappings from the file system (cached)."""
+    prefixes, mappings, _plan = _load_mapping(yml_path)
+    return prefixes, mappings
+
+def _load_mapping(yml_path=YML_MAPPING_PATH):
+    """
+    Returns the cached (prefixes, mappings, compiled_plan) for the mapping
+    file. The YAML parse and plan compilation only depend on the file, so
+    they are cached on (path, mtime) instead of being redone per batch.
+    NOTE: callers must treat the returned objects as read-only.
+    """
     try:
-        with open(yml_path, "r", encoding="utf-8") as f:
-            yml = yaml.safe_load(f)
+        yml_mtime = os.path.getmtime(yml_path)
     except FileNotFoundError:
         raise FileNotFoundError(f"YARRRML mapping file not found at: {yml_path}. Check project structure.")
+    return _load_mapping_cached(yml_path, yml_mtime)
+
+@functools.lru_cache(maxsize=4)
+def _load_mapping_cached(yml_path, yml_mtime):
+    """Parses the YARRRML file and pre-compiles the mapping plan."""
+
+    # print(f"[INFO] Loading YARRRML mapping from: {yml_path}")
+
+    with open(yml_path, "r", encoding="utf-8") as f:
+        yml = yaml.safe_load(f)
 
     prefixes = yml.get("prefixes", {})
     mappings = yml.get("mappings", {})
-    
+
     if "rdf" not in prefixes:
         prefixes["rdf"] = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
-        
-    return prefixes, mappings
 
+    return prefixes, mappings, compile_mapping_plan(prefixes, mappings)
 
-# --- RDF Generation Logic ---
 
-def generate_triples(df: pd.DataFrame) -> str:
+# --- Mapping Pre-compilation ---
+
+def compile_template(template: str) -> Tuple[list, str]:
     """
-    Generates N-Triples RDF string from a DataFrame using the YARRRML mapping.
-    Returns the full string content.
+    Split a template like 'ex:case_$(Col)' into ([(literal, column), ...], tail)
+    so the row loop only has to join strings instead of running the regex.
     """
-    
-    # 1. Load configuration dynamically
-    prefixes, mappings = load_mapping_config()
-    
-    n_triples = []
-    
-    # 2. Iterate over the DataFrame
-    for idx, row in df.iterrows(): 
-        # Apply all mappings
-        for map_name, map_cfg in mappings.items():
-            subj_template = map_cfg.get("s")
-            if not subj_template:
+    chunks = []
+    pos = 0
+    for match in PLACEHOLDER_RE.finditer(template):
+        chunks.append((template[pos:match.start()], match.group(1)))
+        pos = match.end()
+    return chunks, template[pos:]
+
+def compile_mapping_plan(prefixes: dict, mappings: dict) -> list:
+    """
+    Pre-resolve everything about the mapping that is constant across rows:
+    prefix-expanded subject/object templates, predicate IRIs, the
+    resource-vs-literal decision, and the datatype suffix. The row loop
+    then only substitutes column values.
+    """
+    plan = []
+    for map_name, map_cfg in mappings.items():
+        subj_template = map_cfg.get("s")
+        if not subj_template:
+            continue
+
+        subj_compiled = compile_template(expand_prefixed(subj_template, prefixes))
+
+        # Subjects like ex:case_$(Col) end in their ID column; remember it so
+        # rows with an empty ID can be skipped via one mask instead of
+        # string checks on every rendered subject
+        subj_chunks, subj_tail = subj_compiled
+        subj_id_col = subj_chunks[-1][1] if subj_chunks and not subj_tail else None
+
+        po_specs = []
+        for po in map_cfg.get("po", []):
+            if not po or len(po) < 2:
                 continue
 
-            # 2a. Subject generation
-            subj_template_expanded = substitute_placeholders(subj_template, row)
-            subj_iri = expand_prefixed(subj_template_expanded, prefixes)
+            pred_raw = po[0]
+            obj_raw = po[1]
+            datatype_raw = po[2] if len(po) > 2 else None
+
+            # Predicate expansion ('a' is shorthand for rdf:type)
+            if pred_raw == "a":
+                pred_iri = prefixes["rdf"] + "type"
+            else:
+                pred_iri = expand_prefixed(pred_raw, prefixes)
+
+            # Resource vs literal is decided on the raw template, once
+            obj_is_resource = is_prefixed_resource(obj_raw, prefixes)
+            if obj_is_resource:
+                obj_compiled = compile_template(expand_prefixed(obj_raw, prefixes))
+            else:
+                obj_compiled = compile_template(obj_raw)
+
+            # Predicate and datatype suffix are constant per mapping, so
+            # encode them to UTF-8 once here instead of per triple
+            pred_b = f" <{pred_iri}> ".encode("utf-8")
+            dt_suffix_b = f"^^<{expand_prefixed(datatype_raw, prefixes)}>".encode("utf-8") \
+                if datatype_raw else None
+
+            po_specs.append((pred_b, obj_is_resource, obj_compiled, dt_suffix_b))
+
+        plan.append((subj_compiled, subj_id_col, po_specs))
+    return plan
+
+def render_compiled(compiled: Tuple[list, str], col_arrays: dict, i: int) -> str:
+    """Fill a compiled template with the values of row i."""
+    chunks, tail = compiled
+    parts = []
+    for literal, col in chunks:
+        parts.append(literal)
+        arr = col_arrays.get(col)
+        if arr is not None:
+            parts.append(safe_str(arr[i]))
+    parts.append(tail)
+    return "".join(parts)
+
+
+def _column_values(series: pd.Series) -> np.ndarray:
+    """
+    Extract a column as a NumPy object array for the row loop.
+    Categorical columns are stringified once per category and fanned out
+    through the codes array, so duplicates do not pay safe_str() again.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        codes = series.cat.codes.to_numpy()
+        safe_cats = np.array([safe_str(cat) for cat in series.cat.categories], dtype=object)
+        if len(safe_cats) == 0:
+            return np.full(len(series), "", dtype=object)
+        return np.where(codes >= 0, safe_cats[np.maximum(codes, 0)], "")
+    return series.to_numpy(dtype=object)
+
+
+# --- RDF Generation Logic ---
+
+# Row chunks are only rendered in worker processes above this size;
+# below it the process startup cost outweighs the rendering itself
+PARALLEL_MIN_ROWS = 20_000
+
+def generate_triples(df: pd.DataFrame, out) -> int:
+    """
+    Generates N-Triples RDF from a DataFrame using the YARRRML mapping,
+    streaming the UTF-8 output to the binary (buffered) file handle `out`.
+    Returns the number of triples written.
+
+    Rows are independent of each other, so large frames are split into
+    one chunk per CPU and rendered in parallel; the results are written
+    to `out` in chunk order.
+    """
+
+    # 1. Load the cached, pre-compiled mapping configuration
+    _prefixes, _mappings, plan = _load_mapping()
+
+    # 2. Small frames (the common single-report case): render in-process
+    n_workers = os.cpu_count() or 1
+    if len(df) < PARALLEL_MIN_ROWS or n_workers == 1:
+        return _render_rows(df, plan, out.write)
+
+    # 3. Large frames: render row chunks in worker processes
+    # Split positionally with iloc: np.array_split degrades a DataFrame to a
+    # plain 2-D ndarray on recent pandas, which the renderer cannot take
+    bounds = np.linspace(0, len(df), n_workers + 1, dtype=int)
+    chunks = [df.iloc[lo:hi] for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+    triple_count = 0
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        for rendered, chunk_count in pool.map(_render_chunk, [(chunk, plan) for chunk in chunks]):
+            out.write(rendered)
+            triple_count += chunk_count
+    return triple_count
+
+def _render_chunk(args) -> Tuple[bytes, int]:
+    """Worker entry point: render one row chunk to N-Triples bytes."""
+    df_chunk, plan = args
+    buf = BytesIO()
+    triple_count = _render_rows(df_chunk, plan, buf.write)
+    return buf.getvalue(), triple_count
+
+def _valid_subject_mask(df: pd.DataFrame, subj_id_col):
+    """Boolean array marking rows whose subject ID column has a value."""
+    if subj_id_col is None:
+        return None
+    if subj_id_col not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    s = df[subj_id_col]
+    return s.notna().to_numpy() & s.astype(str).str.strip().ne('').to_numpy()
+
+def _render_rows(df: pd.DataFrame, plan: list, write) -> int:
+    """
+    Render every row of df through the pre-compiled mapping plan,
+    accumulating UTF-8 bytes in a bytearray and handing ~1 MiB blocks to
+    `write` (which must accept bytes).
+    """
+
+    triple_count = 0
+
+    # Iterate over plain NumPy column arrays instead of iterrows(),
+    # which would box every row into a Series
+    col_arrays = {col: _column_values(df[col]) for col in df.columns}
+
+    # Skip rows whose subject ID column is empty: one boolean mask per
+    # mapping instead of endswith() checks on every rendered subject
+    plan_with_masks = [
+        (subj_compiled, po_specs, _valid_subject_mask(df, subj_id_col))
+        for subj_compiled, subj_id_col, po_specs in plan
+    ]
+
+    # Bind the hot names to locals: global and attribute lookups inside the
+    # row loop are repeated millions of times on large frames
+    render = render_compiled
+    escape = escape_literal
+
+    # Triples are assembled in a bytearray from the pre-encoded predicate
+    # and datatype constants, so each str is UTF-8 encoded exactly once
+    buf = bytearray()
+    buf_extend = buf.extend
+    flush_bytes = 1 << 20
+
+    for i in range(len(df)):
+        # Apply all pre-compiled mappings
+        for subj_compiled, po_specs, valid in plan_with_masks:
 
             # --- SKIP LOGIC ---
-            if not subj_iri or \
-               subj_iri.endswith("case_") or \
-               subj_iri.endswith("victim_current_place_") or \
-               subj_iri.endswith("departure_place_") or \
-               subj_iri.endswith("destination_place_"):
+            if valid is not None and not valid[i]:
                 continue
             # ------------------
 
-            subj = f"<{subj_iri}>"
-            po_list = map_cfg.get("po", [])
-
-            # 2b. Predicate-Object generation
-            for po in po_list:
-                if not po or len(po) < 2:
-                    continue
-
-                pred_raw = po[0]
-                obj_raw = po[1]
-                datatype_raw = po[2] if len(po) > 2 else None
+            # Subject generation
+            subj_iri = render(subj_compiled, col_arrays, i).strip()
+            if not subj_iri:
+                continue
 
-                # Predicate expansion
-                if pred_raw == "a":
-                    pred_iri = prefixes["rdf"] + "type"
-                else:
-                    pred_iri = expand_prefixed(pred_raw, prefixes)
-                pred = f"<{pred_iri}>"
+            subj_b = f"<{subj_iri}>".encode("utf-8")
 
-                # Object substitution/expansion
-                obj_template_sub = substitute_placeholders(obj_raw, row).strip()
+            # Predicate-Object generation
+            for pred_b, obj_is_resource, obj_compiled, dt_suffix_b in po_specs:
+                obj_val = render(obj_compiled, col_arrays, i).strip()
 
-                if obj_template_sub == "":
+                if obj_val == "":
                     continue
 
-                if is_prefixed_resource(obj_raw, prefixes):
-                    obj_iri = expand_prefixed(obj_template_sub, prefixes)
-                    obj = f"<{obj_iri}>"
+                if obj_is_resource:
+                    obj_b = f"<{obj_val}>".encode("utf-8")
                 else:
                     # Literal
-                    lit = escape_literal(obj_template_sub)
-                    if datatype_raw:
-                        dt_iri = expand_prefixed(datatype_raw, prefixes)
-                        obj = f"\"{lit}\"^^<{dt_iri}>"
-                    else:
-                        obj = f"\"{lit}\""
+                    obj_b = f"\"{escape(obj_val)}\"".encode("utf-8")
+                    if dt_suffix_b:
+                        obj_b += dt_suffix_b
+
+                buf_extend(subj_b)
+                buf_extend(pred_b)
+                buf_extend(obj_b)
+                buf_extend(b" .\n")
+                triple_count += 1
+
+        if len(buf) >= flush_bytes:
+            write(buf)
+            buf.clear()
 
-                n_triples.append(f"{subj} {pred} {obj} .")
+    if buf:
+        write(buf)
 
-    return "\n".join(n_triples)
+    return triple_count
 
 
 # File Writing Function ---
@@ -170,27 +339,28 @@ def save_triples_to_file(df: pd.DataFrame, filename: str = "output.nt") -> str:
     """
     # 1. Ensure intermediate directory exists
     os.makedirs(INTERMEDIATE_DIR, exist_ok=True)
-    
-    # 2. Generate the content
-    rdf_content = generate_triples(df)
-    
-    if not rdf_content:
-        print(f"[WARN] No triples generated for {filename}.")
-        return None
 
-    # 3. Write to file
     output_path = os.path.join(INTERMEDIATE_DIR, filename)
-    
+
+    # 2. Stream the triples straight to disk through a large write buffer,
+    # instead of building the whole N-Triples string in memory first
     try:
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(rdf_content)
-            # Add a final newline if missing, good practice for .nt files
-            if not rdf_content.endswith("\n"):
-                f.write("\n")
-                
-        print(f"[SUCCESS] RDF triples saved to: {output_path}")
-        return output_path
-        
-    except IOError as e:
-        print(f"[ERROR] Failed to write RDF file: {e}")
-        raise e
\ No newline at end of file
+        with open(output_path, "wb", buffering=1 << 20) as f:
+            triple_count = generate_triples(df, f)
+
+    except Exception as e:
+        # Generation died mid-stream: remove the partial file so no
+        # truncated .nt is left behind in the staging area
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        if isinstance(e, IOError):
+            print(f"[ERROR] Failed to write RDF file: {e}")
+        raise
+
+    if triple_count == 0:
+        print(f"[WARN] No triples generated for {filename}.")
+        os.remove(output_path)
+        return None
+
+    print(f"[SUCCESS] RDF triples saved to: {output_path}")
+    return output_path
\ No newline at end of file